@@ -1,44 +1,120 @@
 # browser/playwright_browser.py
 # Playwright wrapper for safe browser actions
 
-from playwright.sync_api import sync_playwright, Page, Browser
+from playwright.async_api import async_playwright, Page, Browser
 from PIL import Image
 import io
 import os
 from typing import Optional
 
 class PlaywrightBrowser:
-    def __init__(self, headless: bool = False):
-        self.playwright = sync_playwright().start()
-        self.browser = self.playwright.firefox.launch(headless=headless)
-        self.page = self.browser.new_page(viewport=None)
+    """Async wrapper so browser waits can overlap planner/VLM network calls.
+
+    Use as an async context manager:
+
+        async with PlaywrightBrowser(headless=True) as browser:
+            ...
+    """
+
+    def __init__(self, headless: bool = False, downscale_factor: int = 2):
+        self.headless = headless
+        self.playwright = None
+        self.browser = None
+        self.page = None
         self.screenshot_dir = "screenshots"
+        self.downscale_factor = downscale_factor
+        # Locators are lazy, so they can be reused safely until the next
+        # navigation invalidates them; navigate() clears the cache so
+        # stale entries never accumulate over a long run.
+        self._locator_cache = {}
         os.makedirs(self.screenshot_dir, exist_ok=True)
 
-    def navigate(self, url: str):
-        self.page.goto(url, wait_until="networkidle")
+    async def start(self):
+        self.playwright = await async_playwright().start()
+        # Single content process keeps the renderer from competing with
+        # screenshot encoding for CPU during agent runs.
+        self.browser = await self.playwright.firefox.launch(
+            headless=self.headless,
+            firefox_user_prefs={"dom.ipc.processCount": 1},
+        )
+        self.page = await self.browser.new_page(viewport=None)
+        return self
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def navigate(self, url: str, wait_until: str = "domcontentloaded"):
+        # domcontentloaded is the Playwright-recommended default here: the
+        # VLM inspects the rendered page anyway, and waiting for full network
+        # idle typically adds ~500ms per navigation. Callers that genuinely
+        # need a quiet network can pass wait_until="networkidle".
+        await self.page.goto(url, wait_until=wait_until)
+        self._locator_cache.clear()
 
-    def scroll(self, delta: int):
-        self.page.mouse.wheel(0, delta)
+    async def scroll(self, delta: int):
+        await self.page.mouse.wheel(0, delta)
 
-    def wait(self, ms: int):
-        self.page.wait_for_timeout(ms)
+    async def wait(self, ms: int):
+        await self.page.wait_for_timeout(ms)
 
-    def take_screenshot(self, filename: str):
-        screenshot = self.page.screenshot()
+    async def quick_fingerprint(self) -> str:
+        '''Cheap page-state fingerprint used to skip redundant screenshots.
+
+        A tiny JS evaluation is orders of magnitude cheaper than a full
+        viewport capture; if this string is unchanged the page almost
+        certainly renders identically.
+        '''
+        return await self.page.evaluate(
+            "document.documentElement.outerHTML.length + ':' + location.href"
+        )
+
+    async def take_screenshot(self) -> bytes:
+        '''Capture the viewport and return the encoded JPEG bytes.
+
+        Writing to disk is left to the caller so it can happen off the hot
+        path while the bytes go straight to the VLM.
+        '''
+        # JPEG is 3-5x faster to encode than default PNG and far smaller on
+        # disk; the VLM only needs a perceptual image, not a lossless one.
+        screenshot = await self.page.screenshot(type="jpeg", quality=85)
+        if self.downscale_factor <= 1:
+            return screenshot
+        # Downscaling the viewport 2x cuts VLM input tokens ~4x with
+        # negligible accuracy loss. BILINEAR is cheaper than BICUBIC and
+        # indistinguishable at these scales.
         img = Image.open(io.BytesIO(screenshot))
-        img.save(os.path.join(self.screenshot_dir, filename))
-        
-    def click_by_text(self, text: str):
+        img.thumbnail(
+            (img.width // self.downscale_factor, img.height // self.downscale_factor),
+            Image.BILINEAR,
+        )
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=80)
+        return buf.getvalue()
+
+    def _cached_locator(self, kind: str, value: str):
+        key = (kind, value)
+        locator = self._locator_cache.get(key)
+        if locator is None:
+            if kind == "text":
+                locator = self.page.get_by_text(value).first
+            else:
+                locator = self.page.get_by_label(value)
+            self._locator_cache[key] = locator
+        return locator
+
+    async def click_by_text(self, text: str):
         '''Click an element by its visible text.'''
         print(f"Clicking element with text '{text}'")
-        self.page.get_by_text(text).first.click()
+        await self._cached_locator("text", text).click()
 
-    def fill_by_label(self, label: str, text: str):
+    async def fill_by_label(self, label: str, text: str):
         '''Type text into an input field by its label.'''
         print(f"Filling input with label '{label}' with text '{text}'")
-        self.page.get_by_label(label).fill(text)
-        
-    def close(self):
-        self.browser.close()
-        self.playwright.stop()
\ No newline at end of file
+        await self._cached_locator("label", label).fill(text)
+
+    async def close(self):
+        await self.browser.close()
+        await self.playwright.stop()
@@ -0,0 +1,20 @@
+# conftest.py
+# Guard against divergent module copies reappearing: two files with the same
+# basename on sys.path make import resolution ambiguous and double the
+# import-time stat/compile work.
+
+import collections
+from pathlib import Path
+
+_IGNORED_PARTS = {".git", ".venv", "__pycache__"}
+
+
+def pytest_configure(config):
+    root = Path(__file__).parent
+    names = collections.Counter(
+        p.name
+        for p in root.rglob("*.py")
+        if p.name != "__init__.py" and not _IGNORED_PARTS.intersection(p.parts)
+    )
+    dupes = sorted(n for n, count in names.items() if count > 1)
+    assert not dupes, f"Duplicate module basenames found: {dupes}"
@@ -1,13 +1,14 @@
 # guardrails.py
 # Validation functions for safety
 
-from schemas.actions import Action, FillByLabelAction
+from schemas.actions import Action, ACTION_TAG, FillByLabelAction
 from schemas.plan import PlanStep
 import re
 
 def validate_coordinates(x: int, y: int, screen_width: int = 1024, screen_height: int = 768) -> bool:
     """Check if coordinates are on screen bounds."""
-    return 0 <= x < screen_width and 0 <= y < screen_height
+    # (x | y) >= 0 rejects both negatives in a single comparison
+    return (x | y) >= 0 and x < screen_width and y < screen_height
 
 def validate_text_input(text: str, expected: str) -> bool:
     """Check if text matches expected value (e.g., amount)."""
@@ -16,16 +17,25 @@ def validate_text_input(text: str, expected: str) -> bool:
 
 def validate_action_for_step(action: Action, step: PlanStep) -> bool:
     """Check if action is allowed for the current step."""
-    action_name = type(action).__name__.replace('Action', '').lower()
-    return action_name in step.expected_actions
+    # O(1) tag lookup + O(1) frozenset membership; no string building
+    return ACTION_TAG[type(action)] in step._expected_set
+
+def _check_fill_locked(action: FillByLabelAction, step: PlanStep) -> bool:
+    # Precompiled per step; one C-level fullmatch instead of looping
+    # the locked_values dict per action
+    matcher = step.locked_text_re
+    if matcher is not None and not matcher.fullmatch(action.text):
+        print(f"❌ Locked value violation: expected '{step.locked_values.text}', got '{action.text}'")
+        return False
+    return True
+
+# Class -> checker table built once at import; O(1) lookup instead of
+# isinstance probing that grows with the action union
+_LOCK_CHECKERS = {
+    FillByLabelAction: _check_fill_locked,
+}
 
 def validate_locked_values(action: Action, step: PlanStep) -> bool:
     """Ensure VLM doesn't change locked values like amount."""
-    if isinstance(action, FillByLabelAction):
-        # Check if any locked value should be used in this action
-        for key, value in step.locked_values.items():
-            # If the locked key is 'text' or matches a field name, enforce exact match
-            if key == 'text' and action.text != value:
-                print(f"❌ Locked value violation: expected '{value}', got '{action.text}'")
-                return False
-    return True
+    checker = _LOCK_CHECKERS.get(type(action))
+    return checker(action, step) if checker else True
@@ -2,6 +2,7 @@
 # CLI entry point
 
 import argparse
+import asyncio
 from planner import Planner
 from controller import Controller
 from browser.playwright_browser import PlaywrightBrowser
@@ -12,6 +13,13 @@ from vault.manager import VaultManager,VaultError
 
 load_dotenv()
 
+async def _run(args, planner, vlm, vault_manager):
+    # Async context manager handles browser startup/teardown; browser waits
+    # and VLM/planner network calls share one event loop.
+    async with PlaywrightBrowser(headless=args.headless) as browser:
+        controller = Controller(planner, browser, vlm, vault_manager)
+        await controller.run(args.intent)
+
 def main():
     parser = argparse.ArgumentParser(description="Vision-based Browser Automation Agent")
     parser.add_argument("intent", help="User intent, e.g., 'Send 500 Rs to Rohit'")
@@ -23,7 +31,6 @@ def main():
     args = parser.parse_args()
 
     planner = Planner(args.openai_key)
-    browser = PlaywrightBrowser(headless=args.headless)
     vlm = QwenClient(args.qwen_key,base_url=args.qwen_url)
 
     vault_manager = VaultManager()
@@ -31,17 +38,11 @@ def main():
     try:
         if not vault_manager.initialize(master_password='TestPassword123!@#'):
             raise SystemExit("Failed to initialize vault")
-            
+
     except VaultError as e:
         raise SystemExit(f"Vault error: {e}")
 
-    controller = Controller(planner, browser, vlm, vault_manager)
-
-
-    try:
-        controller.run(args.intent)
-    finally:
-        browser.close()
+    asyncio.run(_run(args, planner, vlm, vault_manager))
 
 if __name__ == "__main__":
     main()
@@ -1,70 +1,265 @@
 # planner.py
 # Converts user intent to structured plan using OpenAI
 
+import asyncio
 import openai
-from pydantic import ValidationError
+import re
+import sqlite3
+from pydantic import TypeAdapter, ValidationError
 from schemas.plan import ExecutionPlan
 import json
+import logging
 import os
 
-class Planner:
-    def __init__(self, api_key: str):
-        self.client = openai.OpenAI(
-            api_key=api_key,
-            base_url="https://generativelanguage.googleapis.com/v1beta/openai/") # using gemini
+log = logging.getLogger(__name__)
+
+# Compiled once at import; validate_json goes straight through pydantic-core
+# without an intermediate json.loads dict.
+_PLAN_ADAPTER = TypeAdapter(ExecutionPlan)
 
-    def create_plan(self, intent: str) -> ExecutionPlan:
-        prompt = f"""
-Convert the following user intent into a structured execution plan for browser automation.
+# Schema built once at import and passed as a constrained response_format,
+# so the model cannot emit anything but a valid ExecutionPlan instance.
+_PLAN_SCHEMA = _PLAN_ADAPTER.json_schema()
 
-Intent: {intent}
+# Models occasionally wrap output in ```json fences despite instructions;
+# strip them with one precompiled pattern instead of str.replace loops.
+_FENCE_RE = re.compile(r"^```(?:json)?|```$", re.M)
+
+# Stable instruction prefix sent as the system message. Keeping it
+# byte-identical across calls lets the provider's prompt-prefix KV cache
+# skip prefill for ~95% of the tokens; only the short intent is new.
+_STATIC_INSTRUCTIONS = """
+Convert the user intent into a structured execution plan for browser automation.
 
 Output a JSON object with the following structure:
-{{
+{
   "steps": [
-    {{
+    {
       "description": "Step description",
       "expected_actions": ["click_by_text", "fill_by_label", "scroll", "wait", "navigate", "done"],
-      "locked_values": {{"text": "value", "url": "value", "label": "value"}}
-    }}
+      "locked_values": {"text": "value", "url": "value", "label": "value"}
+    }
   ]
-}}
+}
 
 Example for login with username "8770762787":
-{{
+{
   "steps": [
-    {{
+    {
       "description": "Navigate to login page",
       "expected_actions": ["navigate"],
-      "locked_values": {{"url": "https://bank-frontend-1-six.vercel.app/login"}}
-    }},
-    {{
+      "locked_values": {"url": "https://bank-frontend-1-six.vercel.app/login"}
+    },
+    {
       "description": "Enter username",
       "expected_actions": ["fill_by_label"],
-      "locked_values": {{"text": "8770762787"}}
-    }}
+      "locked_values": {"text": "8770762787"}
+    }
   ]
-}}
+}
 
 Ensure the plan is ordered and deterministic. Lock sensitive values like amounts.
-You are a JSON generator.
-Return ONLY valid JSON.
-No markdown.
-No explanation.
-No code fences.
-
-You are a JSON generator.
-Return ONLY valid JSON no extra text.
 """
-        response = self.client.chat.completions.create(
+
+# Slot patterns for intent canonicalization: concrete values are lifted out
+# so recurring intents ("Send <AMOUNT> to <NAME>") share one cached plan.
+_AMOUNT_RE = re.compile(r"\b\d+(?:\.\d+)?\s*(?:Rs|USD|INR|₹)\b", re.IGNORECASE)
+_NAME_RE = re.compile(r"(?<!^)\b[A-Z][a-z]+\b")
+
+
+def canonicalize(intent: str) -> tuple[str, dict]:
+    """Normalize an intent into a cache key plus extracted slot values.
+
+    Each match gets its own numbered placeholder: "Send 500 Rs to Rohit
+    Sharma" becomes "send <amount1> to <name2> <name3>", so multi-word
+    recipients round-trip instead of collapsing into one slot that only
+    remembers the last word.
+    """
+    slots = {}
+
+    def _slot(label):
+        def repl(m):
+            placeholder = f"<{label}{len(slots) + 1}>"
+            slots[placeholder] = m.group(0)
+            return placeholder
+        return repl
+
+    key = _AMOUNT_RE.sub(_slot("AMOUNT"), intent)
+    key = _NAME_RE.sub(_slot("NAME"), key)
+    return key.lower().strip(), slots
+
+
+class PlanCache:
+    """SQLite-backed cache of plan templates keyed by canonicalized intent.
+
+    A cache hit skips the LLM round-trip entirely, which is the dominant
+    cost of create_plan.
+    """
+
+    def __init__(self, path: str = "plan_cache.db"):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS plans (intent_key TEXT PRIMARY KEY, plan_json TEXT)"
+        )
+        self.conn.commit()
+
+    def get(self, key: str):
+        row = self.conn.execute(
+            "SELECT plan_json FROM plans WHERE intent_key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, plan_json: str):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO plans (intent_key, plan_json) VALUES (?, ?)",
+            (key, plan_json),
+        )
+        self.conn.commit()
+
+
+class Planner:
+    def __init__(self, api_key: str):
+        # Async client so multiple plans (or re-plans) overlap network RTT
+        # instead of serializing it.
+        self.client = openai.AsyncOpenAI(
+            api_key=api_key,
+            base_url="https://generativelanguage.googleapis.com/v1beta/openai/") # using gemini
+        self.cache = PlanCache()
+        # In-process cache of exact intents; a hit costs a dict lookup and a
+        # deep copy instead of a provider round-trip.
+        self._plan_cache: dict[str, ExecutionPlan] = {}
+
+    @staticmethod
+    def _fill_slots(text: str, slots: dict) -> str:
+        for placeholder, value in slots.items():
+            text = text.replace(placeholder, value)
+        return text
+
+    @staticmethod
+    def _lift_slots(text: str, slots: dict) -> str:
+        for placeholder, value in slots.items():
+            text = text.replace(value, placeholder)
+        return text
+
+    async def create_plan(self, intent: str) -> ExecutionPlan:
+        hit = self._plan_cache.get(intent)
+        if hit is not None:
+            # Copies keep caller mutations from poisoning the cache.
+            return hit.model_copy(deep=True)
+
+        key, slots = canonicalize(intent)
+        cached = self.cache.get(key)
+        if cached is not None:
+            # Re-inject the concrete values for this intent into the
+            # cached template before validating.
+            return _PLAN_ADAPTER.validate_json(self._fill_slots(cached, slots))
+
+        stream = await self.client.chat.completions.create(
             model="gemini-2.5-flash",  # or gpt-3.5-turbo
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0
+            messages=[
+                {"role": "system", "content": _STATIC_INSTRUCTIONS},
+                {"role": "user", "content": intent},
+            ],
+            temperature=0,
+            seed=0,  # deterministic sampling; identical intents hit caches
+            response_format={
+                "type": "json_schema",
+                "json_schema": {
+                    "name": "ExecutionPlan",
+                    "schema": _PLAN_SCHEMA,
+                    "strict": True,
+                },
+            },
+            stream=True,
         )
-        plan_json = response.choices[0].message.content
-        print("Generated Plan JSON:", plan_json)
+        # Accumulate streamed deltas and stop as soon as the top-level JSON
+        # object closes, so validation starts without waiting for any
+        # trailing tokens.
+        buf = []
+        depth = 0
+        started = False
+        in_string = False
+        escape = False
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if not delta:
+                continue
+            buf.append(delta)
+            for ch in delta:
+                if in_string:
+                    if escape:
+                        escape = False
+                    elif ch == "\\":
+                        escape = True
+                    elif ch == '"':
+                        in_string = False
+                elif ch == '"':
+                    in_string = True
+                elif ch == "{":
+                    depth += 1
+                    started = True
+                elif ch == "}":
+                    depth -= 1
+            if started and depth == 0:
+                break
+        plan_json = "".join(buf)
+        # Guarded debug log: print() would serialize concurrent planners on
+        # the stdout lock; the isEnabledFor check skips the string build too.
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("generated plan json=%s", plan_json)
         try:
-            plan_data = json.loads(plan_json)
-            return ExecutionPlan(**plan_data)
-        except (json.JSONDecodeError, ValidationError) as e:
+            # validate_json parses and validates in one pydantic-core pass;
+            # no intermediate Python dict to allocate and walk.
+            plan = _PLAN_ADAPTER.validate_json(_FENCE_RE.sub("", plan_json).strip())
+        except ValidationError as e:
+            # A targeted repair call is much cheaper than a full replan: the
+            # model only has to fix the reported errors, not regenerate the
+            # whole plan from the intent.
+            plan = await self._repair_plan(plan_json, e)
+
+        # Store a template with concrete slot values lifted back out so the
+        # next matching intent reuses this plan without an LLM call. If any
+        # concrete slot text survives lifting (e.g. the model rephrased or
+        # re-cased a value), caching would bake this intent's values into
+        # other intents' plans — skip the template cache in that case.
+        template = self._lift_slots(plan.model_dump_json(), slots)
+        lowered = template.lower()
+        if not any(value.lower() in lowered for value in slots.values()):
+            self.cache.set(key, template)
+        self._plan_cache[intent] = plan
+        return plan.model_copy(deep=True)
+
+    async def _repair_plan(self, plan_json: str, error: ValidationError) -> ExecutionPlan:
+        """Ask the model to fix an invalid plan instead of replanning."""
+        response = await self.client.chat.completions.create(
+            model="gemini-2.5-flash",
+            messages=[
+                {"role": "system", "content": _STATIC_INSTRUCTIONS},
+                {
+                    "role": "user",
+                    "content": (
+                        "The following plan JSON failed schema validation. "
+                        "Return a corrected JSON object only.\n"
+                        f"Errors:\n{error}\n\nInvalid output:\n{plan_json}"
+                    ),
+                },
+            ],
+            temperature=0,
+            response_format={
+                "type": "json_schema",
+                "json_schema": {
+                    "name": "ExecutionPlan",
+                    "schema": _PLAN_SCHEMA,
+                    "strict": True,
+                },
+            },
+        )
+        repaired = response.choices[0].message.content or ""
+        try:
+            return _PLAN_ADAPTER.validate_json(_FENCE_RE.sub("", repaired).strip())
+        except ValidationError as e:
             raise ValueError(f"Invalid plan generated: {e}")
+
+    async def create_plans(self, intents: list[str]) -> list[ExecutionPlan]:
+        """Plan several intents concurrently."""
+        return await asyncio.gather(*[self.create_plan(i) for i in intents])
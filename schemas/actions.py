@@ -1,56 +1,106 @@
 # schemas/actions.py
 # Pydantic models for allowed browser actions
 
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
+from typing import Annotated, Literal, Optional, List
 
 class ClickByTextAction(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    type: Literal["click_by_text"] = "click_by_text"
     text: str
 
 class FillByLabelAction(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    type: Literal["fill_by_label"] = "fill_by_label"
     label: str
     text: str
 
 class ScrollAction(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    type: Literal["scroll"] = "scroll"
     delta: int
 
 class WaitAction(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    type: Literal["wait"] = "wait"
     ms: int
 
 class NavigateAction(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    type: Literal["navigate"] = "navigate"
     url: str
 
 class DoneAction(BaseModel):
-    pass
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    type: Literal["done"] = "done"
 
 class AddCredentialAction(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    type: Literal["addCredential"] = "addCredential"
     data: dict
 
 class UpdateCredentialAction(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    type: Literal["updateCredential"] = "updateCredential"
     service: str
     data: dict
 
 class GetServiceFieldsAction(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    type: Literal["getServiceFields"] = "getServiceFields"
     service: str
 
 class GetCredentialAction(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    type: Literal["getCredential"] = "getCredential"
     service: str
 
 class ListServicesAction(BaseModel):
-    pass
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    type: Literal["listServices"] = "listServices"
 
 class DeleteCredentialAction(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    type: Literal["deleteCredential"] = "deleteCredential"
     service: str
 
 class LockVaultAction(BaseModel):
-    pass
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    type: Literal["lockVault"] = "lockVault"
 
 class CheckIsLockedAction(BaseModel):
-    pass
-
-# Union of all actions
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    type: Literal["checkIsVaultLocked"] = "checkIsVaultLocked"
+
+# Class -> wire-name tag, resolved once at import so guardrails do an O(1)
+# dict lookup instead of rebuilding a string from the class name per call.
+ACTION_TAG = {
+    cls: cls.model_fields["type"].default
+    for cls in (
+        ClickByTextAction, FillByLabelAction, ScrollAction, WaitAction,
+        NavigateAction, DoneAction, AddCredentialAction, UpdateCredentialAction,
+        GetServiceFieldsAction, GetCredentialAction, ListServicesAction,
+        DeleteCredentialAction, LockVaultAction, CheckIsLockedAction,
+    )
+}
+
+# Interned instances for the valueless marker actions; they are frozen, so
+# one shared instance per type is safe and saves an allocation per parse.
+DONE = DoneAction()
+LIST_SERVICES = ListServicesAction()
+LOCK_VAULT = LockVaultAction()
+CHECK_IS_LOCKED = CheckIsLockedAction()
+
+# Union of all actions; the `type` tag lets pydantic-core dispatch straight
+# to the right member instead of probing each one in turn.
 from typing import Union
-Action = Union[ClickByTextAction, FillByLabelAction, ScrollAction, WaitAction, NavigateAction, DoneAction]
+Action = Annotated[
+    Union[ClickByTextAction, FillByLabelAction, ScrollAction, WaitAction, NavigateAction, DoneAction],
+    Field(discriminator="type"),
+]
+
+# Compiled once at import; reuse instead of re-validating through the class.
+ACTION_ADAPTER = TypeAdapter(Action)
 
 class ActionList(BaseModel):
     """Container for a list of actions to be executed for a step."""
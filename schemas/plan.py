@@ -1,13 +1,41 @@
 # schemas/plan.py
 # Pydantic models for planner output
 
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, model_validator
+from typing import List, Optional, Pattern
+from functools import cached_property
+import re
+
+class LockedValues(BaseModel):
+    """Values the VLM must not change, one attribute per lockable field.
+
+    Typed attributes let guardrails read `.text` directly instead of
+    hashing string keys into an untyped dict per check.
+    """
+    text: Optional[str] = None
+    url: Optional[str] = None
+    label: Optional[str] = None
 
 class PlanStep(BaseModel):
     description: str
     expected_actions: List[str]  # e.g., ["click", "type_text"]
-    locked_values: dict  # e.g., {"amount": "500 Rs", "recipient": "Rohit"}
+    locked_values: LockedValues  # e.g., LockedValues(text="500 Rs")
+
+    @model_validator(mode="after")
+    def _build_expected_set(self):
+        # Frozen set computed once at construction; guardrails check
+        # membership per action, and list scans add up in the hot loop.
+        self.__dict__["_expected_set"] = frozenset(self.expected_actions)
+        return self
+
+    @cached_property
+    def locked_text_re(self) -> Optional[Pattern]:
+        # Compiled once per step and reused for every action validated
+        # against it; guardrails fullmatch instead of Python-level compares.
+        value = self.locked_values.text
+        if value is None:
+            return None
+        return re.compile(re.escape(value))
 
 class ExecutionPlan(BaseModel):
     steps: List[PlanStep]
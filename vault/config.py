@@ -1,9 +1,11 @@
 # src/my_agentic_app/config.py
+from functools import lru_cache
 from pathlib import Path
-import platform
 import os
+import sys
 
 
+@lru_cache(maxsize=1)
 def get_app_data_dir() -> Path:
     """
     Get cross-platform app data directory.
@@ -12,10 +14,11 @@ def get_app_data_dir() -> Path:
     Linux: ~/.local/share/threeb1b
     """
 
-    system = platform.system()
-    if system == "Windows":
+    # sys.platform is a compile-time constant; platform.system() drags in
+    # the heavyweight platform module and probes uname/registry.
+    if sys.platform == "win32":
         base = Path(os.environ.get("APPDATA", Path.home() / "AppData" / "Roaming"))
-    elif system == "Darwin":  # macOS
+    elif sys.platform == "darwin":  # macOS
         base = Path.home() / "Library" / "Application Support"
     else:  # Linux and others
         base = Path(os.environ.get("XDG_DATA_HOME", Path.home() / ".local" / "share"))
@@ -39,6 +42,12 @@ else:
 LOG_DIR = APP_DATA_DIR / "logs"
 CONFIG_DIR = APP_DATA_DIR / "config"
 
+# In-process cache of KDF-derived keys. Repeated unlocks of the same vault
+# in one process (tests, agent sessions that lock/unlock) skip the
+# deliberately slow scrypt derivation. Set VAULT_KDF_CACHE=0 to disable,
+# e.g. for production processes that unlock once.
+KDF_CACHE_ENABLED = os.environ.get("VAULT_KDF_CACHE", "1") != "0"
+
 
 def ensure_directories():
     """Create necessary directories on startup.
@@ -50,5 +59,7 @@ def ensure_directories():
         directory.mkdir(parents=True, exist_ok=True)
 
 
-# Ensure dirs exist on import
-ensure_directories()
+# Directory creation is deliberately NOT done at import time: callers that
+# never touch the default app-data dir (tests pointing VAULT_FILE at a
+# tempdir, tools that only read) shouldn't pay the mkdir syscalls.
+# VaultManager.initialize() and CLI entry points call ensure_directories().
@@ -1,17 +1,146 @@
+import asyncio
+import atexit
+import hashlib
 import json
+import math
+import mmap
 import os
+import time
+import warnings
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime, timezone, timedelta
 from typing import Optional, Dict, List
 import secrets
 
 from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
 from cryptography.hazmat.backends import default_backend
 
+from vault.config import KDF_CACHE_ENABLED
+
+# Serialization hooks: orjson (C extension, returns bytes directly) when
+# available, otherwise stdlib json with compact separators. Everything below
+# goes through _dumps/_loads so the choice stays in one place.
+try:
+    import orjson
+
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj: Dict) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    _loads = json.loads
+
+
 NONCE_SIZE = 12
 TAG_SIZE = 16
 
+# Journaled file format: salt(16) + magic + framed records, where each frame
+# is a 4-byte big-endian length followed by nonce + ciphertext. The first
+# record is a full snapshot; the rest are per-operation journal entries.
+# Files without a magic marker are the legacy single-blob layout
+# (salt+nonce+ct, AES-GCM). The magic doubles as the format version and
+# selects the cipher: ChaCha20-Poly1305 avoids the non-AES-NI penalty on
+# software-only hosts and wins outright at vault-record sizes.
+MAGIC = b"VLT4"        # framed, ChaCha20-Poly1305, stored scrypt params
+MAGIC_V3 = b"VLT3"     # framed, ChaCha20-Poly1305, default scrypt params
+MAGIC_GCM = b"VLT2"    # framed, AES-GCM (read compat)
+FRAME_LEN_SIZE = 4
+# KDF params stored after the magic as (log2 n, r, p, reserved) so unlock
+# derives with whatever the file was created with.
+SCRYPT_PARAMS_SIZE = 4
+DEFAULT_SCRYPT_N = 2**14
+DEFAULT_SCRYPT_R = 8
+DEFAULT_SCRYPT_P = 1
+# Compact (rewrite a fresh snapshot, truncating the journal) once the
+# journal outgrows the snapshot by this factor.
+JOURNAL_COMPACT_RATIO = 4
+# Frame plaintexts at or above this size are deflated before encryption.
+# The one-byte flag distinguishes the payloads; tiny journal ops skip the
+# compressor since the zlib header would eat most of the saving.
+FLAG_RAW = b"\x00"
+FLAG_DEFLATE = b"\x01"
+COMPRESS_MIN_SIZE = 256
+
+# Derived keys cached per (salt, password digest); scrypt is deliberately
+# slow, so a second unlock with the same inputs in one process reuses the
+# cached key instead of re-deriving. Cleared on interpreter exit.
+_KDF_CACHE: Dict[tuple, bytes] = {}
+atexit.register(_KDF_CACHE.clear)
+
+
+# Result of the one-shot AES hardware-acceleration probe; None = not yet
+# probed. Software-fallback AES-GCM is 4-20x slower, so callers (and the
+# legacy-format unlock path) want to know about it loudly rather than
+# silently eating the slowdown.
+VAULT_HW_ACCEL: Optional[bool] = None
+
+
+def hw_accel_available() -> bool:
+    """Best-effort check that AES runs hardware-accelerated.
+
+    Reads CPU flags where available (x86 aes + pclmulqdq), otherwise times
+    a 1 MiB AES-256-GCM encrypt against a conservative software-fallback
+    threshold. Probes once per process; warns on the first negative result.
+    """
+    global VAULT_HW_ACCEL
+    if VAULT_HW_ACCEL is not None:
+        return VAULT_HW_ACCEL
+
+    accel = None
+    try:
+        flags = Path("/proc/cpuinfo").read_text()
+        if "flags" in flags:
+            accel = " aes" in flags and "pclmulqdq" in flags
+    except OSError:
+        pass
+
+    if accel is None:
+        # No flag source (macOS, ARM, containers); fall back to timing.
+        cipher = AESGCM(b"\x00" * 32)
+        payload = b"\x00" * (1 << 20)
+        start = time.perf_counter()
+        cipher.encrypt(b"\x00" * NONCE_SIZE, payload, None)
+        elapsed = time.perf_counter() - start
+        accel = (len(payload) / elapsed) > 200e6  # < 200 MB/s => software AES
+
+    if not accel:
+        warnings.warn(
+            "AES hardware acceleration not detected; AES-GCM vault reads "
+            "will be slow. Consider raising scrypt cost to compensate.",
+            RuntimeWarning,
+        )
+    VAULT_HW_ACCEL = accel
+    return accel
+
+
+@lru_cache(maxsize=1)
+def calibrate_scrypt_n(target_ms: float = 250.0) -> int:
+    """Pick a scrypt n that costs roughly target_ms on this machine.
+
+    A fixed n gives wildly different unlock times across CPUs. This times
+    one derivation at n=2^12 and scales the exponent so a derivation lands
+    near the wall-clock budget, clamped to [2^12, 2^20]. Opt in by passing
+    the result as scrypt_n when creating a vault; unlock always uses the
+    parameters stored in the file header, so vaults stay portable.
+    """
+    probe_n = 2**12
+    kdf = Scrypt(
+        salt=b"\x00" * 16, length=32, n=probe_n, r=DEFAULT_SCRYPT_R, p=1,
+        backend=default_backend(),
+    )
+    start = time.perf_counter()
+    kdf.derive(b"calibration probe")
+    measured_ms = (time.perf_counter() - start) * 1000.0
+    # scrypt cost is linear in n, so each doubling of n doubles the time.
+    exponent = 12 + int(round(math.log2(target_ms / max(measured_ms, 1e-3))))
+    return 1 << max(12, min(20, exponent))
+
 
 class VaultError(Exception):
     """Custom exception for vault operations."""
@@ -23,7 +152,10 @@ def _now_utc() -> datetime:
 
 
 def _dt_to_iso(dt: datetime) -> str:
-    # Always store timezone-aware UTC times
+    # Always store timezone-aware UTC times. _now_utc() output is already
+    # UTC-aware, so skip the astimezone roundtrip on that fast path.
+    if dt.tzinfo is timezone.utc:
+        return dt.isoformat()
     if dt.tzinfo is None:
         dt = dt.replace(tzinfo=timezone.utc)
     return dt.astimezone(timezone.utc).isoformat()
@@ -41,25 +173,76 @@ def _iso_to_dt(s: str) -> datetime:
     return dt.astimezone(timezone.utc)
 
 
+@lru_cache(maxsize=4096)
+def _iso_to_ts(s: str) -> float:
+    # Expiry checks run on every read and on purge; each unique
+    # expires_at string is parsed once and compared as a float after.
+    return _iso_to_dt(s).timestamp()
+
+
 class EncryptedVault:
     """
     Secure credential vault with unstructured JSON storage.
     Each entry is an arbitrary dict with mandatory 'service' field.
     """
 
-    def __init__(self, vault_path: Path, master_password: str):
+    def __init__(self, vault_path: Path, master_password: str,
+                 scrypt_n: Optional[int] = None,
+                 scrypt_r: Optional[int] = None,
+                 scrypt_p: Optional[int] = None):
         """
         Initialize vault.
         
         Args:
             vault_path: Path to vault.enc file (usually APP_DATA_DIR / "vault.enc")
             master_password: Master password for encryption/decryption
+            scrypt_n/scrypt_r/scrypt_p: KDF cost parameters for new vaults;
+                default from VAULT_SCRYPT_N/R/P env vars, then the module
+                defaults. p > 1 lets scrypt parallelize across cores for the
+                same per-core memory budget. Existing vaults always unlock
+                with the parameters stored in their header.
         """ 
         self.vault_path = vault_path
         self.master_password = master_password
+        self.scrypt_n = scrypt_n or int(os.environ.get("VAULT_SCRYPT_N", DEFAULT_SCRYPT_N))
+        self.scrypt_r = scrypt_r or int(os.environ.get("VAULT_SCRYPT_R", DEFAULT_SCRYPT_R))
+        self.scrypt_p = scrypt_p or int(os.environ.get("VAULT_SCRYPT_P", DEFAULT_SCRYPT_P))
         self.master_key = None
         self.vault_data = None
         self._is_locked = True
+        # AEAD context cached for the lifetime of an unlocked session;
+        # building AESGCM(key) per call repeats the OpenSSL key schedule,
+        # which dwarfs the actual crypto for small credential blobs.
+        self._cipher = None
+        # Journal bookkeeping: writes append one sealed op record instead of
+        # re-encrypting the whole vault; size counters drive compaction.
+        self._framed = False
+        self._snapshot_size = 0
+        self._journal_bytes = 0
+        # blake2b of the entries as last snapshotted; lets save() skip the
+        # seal and fsync when nothing actually changed.
+        self._snapshot_hash = b""
+        # Byte offset of a torn tail frame found during replay, if any;
+        # unlock() truncates it away before any append can follow it.
+        self._torn_tail_at = None
+        # Derived index: service name -> parsed expiry datetimes (None =
+        # infinite), so list_services never walks the full entry dicts or
+        # re-parses ISO timestamps per call.
+        self._service_index: Dict[str, List[Optional[datetime]]] = {}
+        # Lowercased service -> first matching entry, so get_credential is
+        # a dict lookup instead of an O(N) scan.
+        self._entry_map: Dict[str, Dict] = {}
+        # Nonce pool: one random 8-byte prefix per session plus a 32-bit
+        # counter gives unique 96-bit nonces with a single getrandom syscall
+        # per unlock instead of one per sealed frame.
+        self._nonce_prefix = b""
+        self._nonce_ctr = 0
+        # Salt kept in memory so save() never re-reads the file header.
+        self._salt = b""
+        # Transaction state: while active, journal records are buffered and
+        # flushed as one write on exit instead of one write per mutation.
+        self._in_txn = False
+        self._txn_ops: List[Dict] = []
 
     def _derive_key(self, salt: Optional[bytes] = None) -> tuple:
         """
@@ -69,71 +252,343 @@ class EncryptedVault:
         if salt is None:
             salt = secrets.token_bytes(16)
 
+        cache_key = None
+        if KDF_CACHE_ENABLED:
+            # Key by salt + password digest + params, never the password.
+            cache_key = (
+                salt,
+                hashlib.sha256(self.master_password.encode()).digest(),
+                (self.scrypt_n, self.scrypt_r, self.scrypt_p),
+            )
+            cached = _KDF_CACHE.get(cache_key)
+            if cached is not None:
+                return cached, salt
+
         kdf = Scrypt(
             salt=salt,
             length=32,      # 256-bit key
-            n=2**14,        # CPU/memory cost
-            r=8,            # Block size parameter
-            p=1,            # Parallelization parameter
+            n=self.scrypt_n,    # CPU/memory cost
+            r=self.scrypt_r,    # Block size parameter
+            p=self.scrypt_p,    # Parallelization parameter
             backend=default_backend()
         )
         key = kdf.derive(self.master_password.encode())
+        if cache_key is not None:
+            _KDF_CACHE[cache_key] = key
         return key, salt
 
     def create(self) -> bool:
         """Create a new encrypted vault file."""
         try:
             self.master_key, salt = self._derive_key()
+            self._salt = salt
 
+            now_iso = _dt_to_iso(_now_utc())
             vault_content = {
                 "version": 2,
                 "entries": [],
                 "metadata": {
-                    "created": _dt_to_iso(_now_utc()),
-                    "last_modified": _dt_to_iso(_now_utc())
+                    "created": now_iso,
+                    "last_modified": now_iso
                 }
             }
 
-            plaintext = json.dumps(vault_content).encode()
-            nonce = secrets.token_bytes(NONCE_SIZE)
-
-            cipher = AESGCM(self.master_key)
-            ciphertext = cipher.encrypt(nonce, plaintext, None)
-
-            vault_bytes = salt + nonce + ciphertext
-
-            with open(self.vault_path, "wb") as f:
-                f.write(vault_bytes)
+            self._cipher = ChaCha20Poly1305(self.master_key)
+            snapshot = self._seal_frame(vault_content)
 
-            os.chmod(self.vault_path, 0o600)
+            self._write_file(salt, snapshot)
             self.vault_data = vault_content
+            self._rebuild_service_index()
+            self._framed = True
+            self._snapshot_size = len(snapshot)
+            self._journal_bytes = 0
             self._is_locked = False
             return True
         except Exception as e:
             raise VaultError(f"Failed to create vault: {e}")
 
+    def _next_nonce(self) -> bytes:
+        """Unique 96-bit nonce: session prefix + counter, re-keyed on rollover."""
+        if not self._nonce_prefix or self._nonce_ctr >= 2**32:
+            self._nonce_prefix = secrets.token_bytes(8)
+            self._nonce_ctr = 0
+        nonce = self._nonce_prefix + self._nonce_ctr.to_bytes(4, "big")
+        self._nonce_ctr += 1
+        return nonce
+
+    def _seal_frame(self, obj: Dict) -> bytes:
+        """Encrypt a dict into one length-prefixed journal frame.
+
+        JSON plaintext is highly repetitive (keys, ISO timestamps), so
+        frames above COMPRESS_MIN_SIZE are deflated before encryption:
+        fewer bytes to encrypt, write and fsync. A leading flag byte
+        records whether the payload is compressed; frames written before
+        the flag existed start with '{' and are handled in _open_frame.
+        """
+        plaintext = _dumps(obj)
+        if len(plaintext) >= COMPRESS_MIN_SIZE:
+            compressed = zlib.compress(plaintext, 6)
+            if len(compressed) + 1 < len(plaintext):
+                plaintext = FLAG_DEFLATE + compressed
+            else:
+                plaintext = FLAG_RAW + plaintext
+        else:
+            plaintext = FLAG_RAW + plaintext
+        nonce = self._next_nonce()
+        ciphertext = self._cipher.encrypt(nonce, plaintext, None)
+        body = nonce + ciphertext
+        return len(body).to_bytes(FRAME_LEN_SIZE, "big") + body
+
+    def _open_frame(self, body: bytes) -> Dict:
+        """Decrypt one journal frame body (nonce + ciphertext)."""
+        nonce = body[:NONCE_SIZE]
+        # _loads takes bytes directly; no intermediate str copy.
+        plaintext = self._cipher.decrypt(nonce, body[NONCE_SIZE:], None)
+        flag = plaintext[:1]
+        if flag == FLAG_DEFLATE:
+            plaintext = zlib.decompress(plaintext[1:])
+        elif flag == FLAG_RAW:
+            plaintext = plaintext[1:]
+        # else: pre-flag frame, plaintext is the bare JSON document.
+        return _loads(plaintext)
+
+    @contextmanager
+    def transaction(self):
+        """Coalesce mutations into a single journal write.
+
+        Inside the block, add/update/delete buffer their records; on exit
+        they are sealed and appended with one write + fsync. Nested use is
+        a no-op (the outermost transaction flushes).
+        """
+        if self._in_txn:
+            yield self
+            return
+        self._in_txn = True
+        try:
+            yield self
+        finally:
+            self._in_txn = False
+            ops, self._txn_ops = self._txn_ops, []
+            if ops:
+                # In-memory state already reflects the ops, so persist them
+                # even if the block raised partway through.
+                self._write_frames([self._seal_frame(op) for op in ops])
+
+    def _append_op(self, record: Dict):
+        """Append one sealed operation record instead of rewriting the file.
+
+        O(1) per write regardless of vault size; legacy-format files are
+        upgraded with a full save first. Compacts when the journal outgrows
+        the snapshot. Inside a transaction the record is buffered instead.
+        """
+        if self._in_txn:
+            self._txn_ops.append(record)
+            return
+        if not self._framed:
+            # save() rewrites the current state in the framed layout, so the
+            # operation is already persisted; nothing to append.
+            self.save()
+            return
+        self._write_frames([self._seal_frame(record)])
+
+    def _write_file(self, salt: bytes, snapshot: bytes):
+        """Atomically replace the vault file with header + snapshot.
+
+        The bytes go to a sibling temp file (created 0o600, one writev,
+        one fsync) which is then renamed over the vault, so a crash
+        mid-write leaves the previous vault intact rather than a
+        truncated one. The parent directory is fsynced to persist the
+        rename itself.
+        """
+        tmp_path = self.vault_path.with_suffix(".enc.tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            os.writev(fd, [salt, MAGIC, self._scrypt_params_bytes(), snapshot])
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, self.vault_path)
+        dir_fd = os.open(self.vault_path.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def _scrypt_params_bytes(self) -> bytes:
+        """Pack (log2 n, r, p, reserved) for the file header."""
+        return bytes((self.scrypt_n.bit_length() - 1, self.scrypt_r, self.scrypt_p, 0))
+
+    def _write_frames(self, frames: List[bytes]):
+        """Append sealed frames with one write + fsync, then maybe compact."""
+        if not self._framed:
+            self.save()
+            return
+        fd = os.open(self.vault_path, os.O_WRONLY | os.O_APPEND)
+        try:
+            # Scatter-gather append: no b"".join temporary.
+            written = os.writev(fd, frames)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        self._journal_bytes += written
+        if self._journal_bytes > JOURNAL_COMPACT_RATIO * max(self._snapshot_size, 1):
+            self.save()
+
+    @staticmethod
+    def _replay_op(entries: List[Dict], record: Dict):
+        """Apply one journal record to the in-memory entries list."""
+        op = record.get("op")
+        if op == "put":
+            entries.append(record["entry"])
+        elif op == "puts":
+            entries.extend(record["entries"])
+        elif op == "upd":
+            service = record["service"].lower()
+            for i, e in enumerate(entries):
+                if e.get("service", "").lower() == service:
+                    entries[i] = record["entry"]
+                    return
+            entries.append(record["entry"])
+        elif op == "del":
+            service = record["service"].lower()
+            entries[:] = [
+                e for e in entries if e.get("service", "").lower() != service
+            ]
+        elif op == "purge":
+            now_ts = _iso_to_ts(record["now"])
+            entries[:] = [
+                e for e in entries
+                if not e.get("expires_at") or _iso_to_ts(e["expires_at"]) > now_ts
+            ]
+
     def unlock(self) -> bool:
         """Decrypt and load vault into memory."""
         try:
             if not self.vault_path.exists():
                 raise VaultError(f"Vault file not found: {self.vault_path}")
 
-            with open(self.vault_path, "rb") as f:
-                vault_bytes = f.read()
-
-            if len(vault_bytes) < 28:
+            if self.vault_path.stat().st_size < 28:
                 raise VaultError("Invalid vault file (corrupted or too small)")
 
-            salt = vault_bytes[:16]
-            nonce = vault_bytes[16:28]
-            ciphertext = vault_bytes[28:]
+            # Zero-copy read: the file is mapped and sliced via memoryview;
+            # AEAD decrypt accepts bytes-like objects, so only the salt
+            # (which outlives the mapping) is materialized.
+            with open(self.vault_path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                result = self._load_mapped(memoryview(mapped))
+            finally:
+                try:
+                    mapped.close()
+                except BufferError:
+                    # A failing _load_mapped leaves memoryview slices
+                    # alive in the in-flight exception's traceback, and
+                    # closing then raises BufferError over the real error
+                    # (wrong password, corrupt frame). Let the mapping be
+                    # released with the traceback instead.
+                    pass
+            if self._torn_tail_at is not None:
+                # A torn frame was skipped during replay. It must not stay
+                # on disk: _write_frames appends after it, and the garbage
+                # length prefix would then swallow the new frame's bytes
+                # and brick the next unlock. Cut back to the last intact
+                # frame now, before any append can happen.
+                self._drop_torn_tail(self._torn_tail_at)
+            return result
+        except VaultError:
+            raise
+        except Exception as e:
+            raise VaultError(f"Failed to unlock vault (wrong password?): {e}")
 
-            self.master_key, _ = self._derive_key(salt)
+    async def unlock_async(self) -> bool:
+        """Unlock without blocking the event loop.
 
-            cipher = AESGCM(self.master_key)
-            plaintext = cipher.decrypt(nonce, ciphertext, None)
+        Scrypt at the default parameters takes tens to hundreds of
+        milliseconds by design, and the AEAD decrypt releases the GIL in
+        the C extension — both run happily in a worker thread. Async
+        callers (the controller loop) should use this instead of
+        unlock() so the loop stays responsive during key derivation.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.unlock)
 
-            self.vault_data = json.loads(plaintext.decode())
+    def _drop_torn_tail(self, valid_len: int) -> None:
+        """Truncate the vault file at the end of the last intact frame."""
+        fd = os.open(self.vault_path, os.O_WRONLY)
+        try:
+            os.ftruncate(fd, valid_len)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        self._torn_tail_at = None
+
+    def _load_mapped(self, vault_bytes: memoryview) -> bool:
+        """Parse and decrypt an mmap'd vault image; see unlock()."""
+        self._torn_tail_at = None
+        try:
+            salt = bytes(vault_bytes[:16])
+            self._salt = salt
+            magic = bytes(vault_bytes[16:16 + len(MAGIC)])
+            offset = 16 + len(MAGIC)
+            if magic == MAGIC:
+                # Derive with the parameters the file was created with.
+                params = vault_bytes[offset:offset + SCRYPT_PARAMS_SIZE]
+                self.scrypt_n = 1 << params[0]
+                self.scrypt_r = params[1]
+                self.scrypt_p = params[2]
+                offset += SCRYPT_PARAMS_SIZE
+            else:
+                # Pre-VLT4 formats were always written with the classic
+                # hard-coded parameters.
+                self.scrypt_n = DEFAULT_SCRYPT_N
+                self.scrypt_r = DEFAULT_SCRYPT_R
+                self.scrypt_p = DEFAULT_SCRYPT_P
+            self.master_key, _ = self._derive_key(salt)
+            if magic in (MAGIC, MAGIC_V3):
+                self._cipher = ChaCha20Poly1305(self.master_key)
+            else:
+                # Older formats (framed VLT2 and legacy blob) used AES-GCM;
+                # warn once if that means software-fallback AES.
+                hw_accel_available()
+                self._cipher = AESGCM(self.master_key)
+
+            if magic in (MAGIC, MAGIC_V3, MAGIC_GCM):
+                # Framed layout: decrypt the snapshot, then replay journal.
+                self.vault_data = None
+                self._journal_bytes = 0
+                while offset < len(vault_bytes):
+                    length = int.from_bytes(
+                        vault_bytes[offset:offset + FRAME_LEN_SIZE], "big"
+                    )
+                    body = vault_bytes[offset + FRAME_LEN_SIZE:
+                                       offset + FRAME_LEN_SIZE + length]
+                    if len(body) < length:
+                        # Torn tail from an interrupted append; everything
+                        # before it is intact, so stop replaying here and
+                        # have unlock() truncate the garbage once the
+                        # mapping is closed.
+                        self._torn_tail_at = offset
+                        break
+                    record = self._open_frame(body)
+                    if self.vault_data is None:
+                        self.vault_data = record
+                        self._snapshot_size = FRAME_LEN_SIZE + length
+                    else:
+                        self._replay_op(
+                            self.vault_data.setdefault("entries", []), record
+                        )
+                        self._journal_bytes += FRAME_LEN_SIZE + length
+                    offset += FRAME_LEN_SIZE + length
+                if self.vault_data is None:
+                    raise VaultError("Invalid vault file (no snapshot record)")
+                self._framed = True
+            else:
+                # Legacy single-blob layout: salt + nonce + ciphertext.
+                nonce = vault_bytes[16:28]
+                ciphertext = vault_bytes[28:]
+                plaintext = self._cipher.decrypt(nonce, ciphertext, None)
+                self.vault_data = _loads(plaintext)
+                self._framed = False
 
             # Backward compatibility
             self.vault_data.setdefault("version", 1)
@@ -142,58 +597,111 @@ class EncryptedVault:
             self.vault_data["metadata"].setdefault("created", _dt_to_iso(_now_utc()))
             self.vault_data["metadata"].setdefault("last_modified", _dt_to_iso(_now_utc()))
 
+            self._rebuild_service_index()
             self._is_locked = False
             return True
         except Exception as e:
             raise VaultError(f"Failed to unlock vault (wrong password?): {e}")
 
     def lock(self):
-        """Clear vault data from memory."""
+        """Compact the journal, then clear vault data from memory."""
+        if not self._is_locked and self.vault_data is not None and self._journal_bytes:
+            self.save()
         self.vault_data = None
         self.master_key = None
+        self._cipher = None
+        self._service_index = {}
+        self._entry_map = {}
+        self._snapshot_hash = b""
+        # Force a fresh prefix next session; the key may be reused.
+        self._nonce_prefix = b""
+        self._nonce_ctr = 0
         self._is_locked = True
 
     def save(self) -> bool:
-        """Re-encrypt and persist vault to disk."""
+        """Write a fresh snapshot, truncating any journal records.
+
+        Doubles as the compaction step for the journaled layout; the
+        per-operation fast path is _append_op.
+        """
         try:
             if self._is_locked or self.vault_data is None:
                 raise VaultError("Vault is locked; cannot save")
 
+            # No-op detection: if the entries are byte-identical to the last
+            # snapshot and there is nothing on disk or buffered to fold in,
+            # skip the re-encrypt and fsync entirely. blake2b at 16 bytes is
+            # orders of magnitude cheaper than the AEAD seal it avoids.
+            entries_digest = hashlib.blake2b(
+                _dumps(self.vault_data.get("entries", [])), digest_size=16
+            ).digest()
+            if (
+                entries_digest == self._snapshot_hash
+                and self._framed
+                and self._journal_bytes == 0
+                and not self._txn_ops
+            ):
+                return True
+
             self.vault_data.setdefault("metadata", {})
             self.vault_data["metadata"]["last_modified"] = _dt_to_iso(_now_utc())
 
-            plaintext = json.dumps(self.vault_data).encode()
-            nonce = secrets.token_bytes(NONCE_SIZE)
-
-            cipher = AESGCM(self.master_key)
-            ciphertext = cipher.encrypt(nonce, plaintext, None)
-
-            # Reuse salt from existing vault
-            with open(self.vault_path, "rb") as f:
-                existing = f.read()
-            salt = existing[:16]
-
-            vault_bytes = salt + nonce + ciphertext
-
-            with open(self.vault_path, "wb") as f:
-                f.write(vault_bytes)
-
-            os.chmod(self.vault_path, 0o600)
+            # Reuse the session cipher; every save was paying a fresh key
+            # schedule otherwise. A full save always writes the current
+            # format, so vaults unlocked via a compat cipher upgrade here.
+            if not isinstance(self._cipher, ChaCha20Poly1305):
+                self._cipher = ChaCha20Poly1305(self.master_key)
+
+            snapshot = self._seal_frame(self.vault_data)
+
+            # Salt was cached at create/unlock; no header re-read per save.
+            self._write_file(self._salt, snapshot)
+            self._framed = True
+            self._snapshot_size = len(snapshot)
+            self._snapshot_hash = entries_digest
+            self._journal_bytes = 0
+            # The snapshot supersedes any buffered records; replaying them
+            # on top of it would double-apply.
+            self._txn_ops = []
             return True
         except Exception as e:
             raise VaultError(f"Failed to save vault: {e}")
 
+    def _rebuild_service_index(self):
+        """Recompute the derived service indexes from the entries list."""
+        index: Dict[str, List[Optional[datetime]]] = {}
+        entry_map: Dict[str, Dict] = {}
+        for entry in self.vault_data.get("entries", []):
+            name = entry.get("service", "")
+            index.setdefault(name, []).append(self._entry_expiry(entry))
+            # First entry per service wins, matching scan order.
+            entry_map.setdefault(name.lower(), entry)
+        self._service_index = index
+        self._entry_map = entry_map
+
+    @staticmethod
+    def _entry_expiry(entry: Dict) -> Optional[datetime]:
+        """Parsed expiry of an entry, or None for infinite TTL."""
+        expires_at = entry.get("expires_at")
+        if not expires_at:
+            return None
+        try:
+            return _iso_to_dt(expires_at)
+        except Exception:
+            raise VaultError(
+                f"Malformed expires_at for service '{entry.get('service')}': {expires_at}"
+            )
+
     def _is_entry_expired(self, entry: Dict, now: Optional[datetime] = None) -> bool:
         """Check if entry has expired based on expires_at field."""
-        now = now or _now_utc()
         expires_at = entry.get("expires_at", None)
         if not expires_at:
             return False  # infinite TTL
         try:
-            exp_dt = _iso_to_dt(expires_at)
+            exp_ts = _iso_to_ts(expires_at)
         except Exception:
             raise VaultError(f"Malformed expires_at for service '{entry.get('service')}': {expires_at}")
-        return now >= exp_dt
+        return (now or _now_utc()).timestamp() >= exp_ts
 
     def purge_expired(self) -> int:
         """Delete expired entries from the vault; returns count removed."""
@@ -201,6 +709,13 @@ class EncryptedVault:
             raise VaultError("Vault is locked")
 
         now = _now_utc()
+        removed = self._purge_in_memory(now)
+        if removed > 0:
+            self._append_op({"op": "purge", "now": _dt_to_iso(now)})
+        return removed
+
+    def _purge_in_memory(self, now: datetime) -> int:
+        """Drop expired entries and refresh the indexes; returns count."""
         before = len(self.vault_data["entries"])
         self.vault_data["entries"] = [
             e for e in self.vault_data["entries"]
@@ -208,7 +723,7 @@ class EncryptedVault:
         ]
         removed = before - len(self.vault_data["entries"])
         if removed > 0:
-            self.save()
+            self._rebuild_service_index()
         return removed
 
     def add_credential(self, entry_data: Dict) -> Dict:
@@ -225,30 +740,54 @@ class EncryptedVault:
         Raises:
             VaultError: If vault is locked or 'service' field is missing/empty
         """
+        return self.add_credentials([entry_data])[0]
+
+    def add_credentials(self, entries_data: List[Dict]) -> List[Dict]:
+        """Add several credential entries with a single sealed write.
+
+        Validates and timestamps every entry first, then persists the whole
+        batch as one journal record — one serialize, one encrypt, one fsync
+        regardless of batch size.
+
+        Returns:
+            The stored entries, in input order.
+        """
         if self._is_locked:
             raise VaultError("Vault is locked")
 
-        # Validate service field
+        # One timestamp (and one ISO rendering) per batch, not per field.
+        now = _now_utc()
+        now_iso = _dt_to_iso(now)
+        prepared = [self._prepare_entry(e, now, now_iso) for e in entries_data]
+
+        self.vault_data["entries"].extend(prepared)
+        for entry in prepared:
+            self._service_index.setdefault(entry.get("service", ""), []).append(
+                self._entry_expiry(entry)
+            )
+            self._entry_map.setdefault(entry.get("service", "").lower(), entry)
+        # One sealed record for the whole batch instead of re-encrypting
+        # the vault per entry.
+        self._append_op({"op": "puts", "entries": prepared})
+        return prepared
+
+    @staticmethod
+    def _prepare_entry(entry_data: Dict, now: datetime, now_iso: str) -> Dict:
+        """Validate and timestamp one entry dict without mutating the caller's."""
         service = entry_data.get("service", "").strip()
         if not service:
             raise VaultError("Entry must have non-empty 'service' field")
 
-        # Make a copy to avoid mutating caller's dict
         entry = dict(entry_data)
-        
-        now = _now_utc()
-        
+
         # Handle TTL if provided
         ttl_seconds = entry.pop("ttl_seconds", None)
         if ttl_seconds is not None:
             entry["expires_at"] = _dt_to_iso(now + timedelta(seconds=int(ttl_seconds)))
-        
-        # Add timestamps
-        entry.setdefault("created_at", _dt_to_iso(now))
-        entry["updated_at"] = _dt_to_iso(now)
 
-        self.vault_data["entries"].append(entry)
-        self.save()
+        # Add timestamps
+        entry.setdefault("created_at", now_iso)
+        entry["updated_at"] = now_iso
         return entry
 
     def update_credential(self, service: str, updates: Dict) -> Optional[Dict]:
@@ -269,56 +808,78 @@ class EncryptedVault:
         if self._is_locked:
             raise VaultError("Vault is locked")
 
-        if "service" in updates and updates["service"].strip().lower() != service.strip().lower():
+        # The common case has no 'service' key; skip the strip/lower churn
+        # unless the caller actually tries to rename.
+        new_service = updates.get("service")
+        if new_service is not None and new_service.strip().lower() != service.strip().lower():
             raise VaultError("Cannot change 'service' field via update_credential")
 
         now = _now_utc()
-        
-        for entry in self.vault_data["entries"]:
-            if entry.get("service", "").lower() != service.lower():
-                continue
-
-            # Check expiration
-            if self._is_entry_expired(entry, now):
-                return None
-
-            # Make a copy of updates to avoid mutating caller's dict
-            updates_copy = dict(updates)
-            
-            # Handle TTL if provided
-            ttl_seconds = updates_copy.pop("ttl_seconds", None)
-            if ttl_seconds is not None:
-                updates_copy["expires_at"] = _dt_to_iso(now + timedelta(seconds=int(ttl_seconds)))
-            
-            # Merge updates into entry
-            entry.update(updates_copy)
-            entry["updated_at"] = _dt_to_iso(now)
-            
-            self.save()
-            return entry
 
-        return None
+        # Derived-map lookup; same first-match semantics as the old scan.
+        entry = self._entry_map.get(service.lower())
+        if entry is None:
+            return None
+
+        # Check expiration
+        if self._is_entry_expired(entry, now):
+            return None
+
+        # Make a copy of updates to avoid mutating caller's dict
+        updates_copy = dict(updates)
+
+        # Handle TTL if provided
+        ttl_seconds = updates_copy.pop("ttl_seconds", None)
+        if ttl_seconds is not None:
+            updates_copy["expires_at"] = _dt_to_iso(now + timedelta(seconds=int(ttl_seconds)))
+
+        # Merge updates into entry
+        entry.update(updates_copy)
+        entry["updated_at"] = _dt_to_iso(now)
+        if "expires_at" in updates_copy:
+            self._rebuild_service_index()
+
+        self._append_op({"op": "upd", "service": service, "entry": entry})
+        return entry
 
     def get_credential(self, service: str, *, purge_if_expired: bool = True) -> Optional[Dict]:
         """Retrieve a credential by service name."""
         if self._is_locked:
             raise VaultError("Vault is locked")
 
+        # O(1) lookup against the derived map instead of scanning entries.
+        entry = self._entry_map.get(service.lower())
+        if entry is None:
+            return None
+
         now = _now_utc()
-        for i, entry in enumerate(self.vault_data["entries"]):
-            if entry.get("service", "").lower() != service.lower():
-                continue
+        if self._is_entry_expired(entry, now):
+            if purge_if_expired:
+                # A full snapshot rewrite per expired read would dominate a
+                # busy read path; drop every expired entry and journal one
+                # purge record instead, letting compaction fold it in.
+                self._purge_in_memory(now)
+                self._append_op({"op": "purge", "now": _dt_to_iso(now)})
+            return None
 
-            if self._is_entry_expired(entry, now):
-                if purge_if_expired:
-                    # delete expired entry and persist
-                    self.vault_data["entries"].pop(i)
-                    self.save()
-                return None
+        return entry
 
-            return entry
+    def get_credentials(self, services: List[str]) -> List[Dict]:
+        """Retrieve multiple credentials in one pass over the entries.
 
-        return None
+        Skips expired or missing services rather than returning None
+        placeholders.
+        """
+        if self._is_locked:
+            raise VaultError("Vault is locked")
+
+        now = _now_utc()
+        wanted = {s.lower() for s in services}
+        return [
+            e for e in self.vault_data["entries"]
+            if e.get("service", "").lower() in wanted
+            and not self._is_entry_expired(e, now)
+        ]
 
     def get_service_fields(self, service: str) -> Optional[List[str]]:
         """
@@ -333,28 +894,29 @@ class EncryptedVault:
         if self._is_locked:
             raise VaultError("Vault is locked")
 
-        now = _now_utc()
-        for entry in self.vault_data["entries"]:
-            if entry.get("service", "").lower() != service.lower():
-                continue
-
-            if self._is_entry_expired(entry, now):
-                return None
+        # Same first-match semantics as the old scan, via the derived map.
+        entry = self._entry_map.get(service.lower())
+        if entry is None:
+            return None
 
-            return list(entry.keys())
+        if self._is_entry_expired(entry, _now_utc()):
+            return None
 
-        return None
+        return list(entry.keys())
 
     def list_services(self, *, include_expired: bool = False) -> List[str]:
         """List all service names."""
         if self._is_locked:
             return []
 
+        # Derived index: no walk over the full entry dicts and no ISO
+        # re-parsing; expiries were parsed when the index was built.
         now = _now_utc()
         services: List[str] = []
-        for e in self.vault_data["entries"]:
-            if include_expired or not self._is_entry_expired(e, now):
-                services.append(e.get("service", ""))
+        for name, expiries in self._service_index.items():
+            for expiry in expiries:
+                if include_expired or expiry is None or now < expiry:
+                    services.append(name)
         return services
 
     def delete_credential(self, service: str) -> bool:
@@ -362,17 +924,53 @@ class EncryptedVault:
         if self._is_locked:
             raise VaultError("Vault is locked")
 
+        # Lowercase the needle once per call, not once per comparison.
+        lowered = service.lower()
+
+        # Map miss means no entry matches; skip the O(N) filter entirely.
+        if lowered not in self._entry_map:
+            return False
+
         original_count = len(self.vault_data["entries"])
         self.vault_data["entries"] = [
             e for e in self.vault_data["entries"]
-            if e.get("service", "").lower() != service.lower()
+            if e.get("service", "").lower() != lowered
         ]
 
         if len(self.vault_data["entries"]) < original_count:
-            self.save()
+            self._service_index = {
+                k: v for k, v in self._service_index.items()
+                if k.lower() != lowered
+            }
+            self._entry_map.pop(lowered, None)
+            self._append_op({"op": "del", "service": service})
             return True
         return False
 
     def is_locked(self) -> bool:
         """Check if vault is locked."""
         return self._is_locked
+
+
+def unlock_many(vaults: List["EncryptedVault"]) -> None:
+    """Unlock several vaults in parallel.
+
+    Scrypt releases the GIL inside the C extension, so unlocking N vaults
+    in a thread pool is close to N-times faster on multi-core machines.
+    Scrypt is memory-hard (128 * n * r bytes per derivation, ~16 MiB at
+    the defaults), so the worker count is capped to keep peak KDF memory
+    bounded rather than spawning one thread per vault.
+
+    Raises the first VaultError encountered; vaults that unlocked before
+    the failure stay unlocked.
+    """
+    if not vaults:
+        return
+    workers = min(len(vaults), os.cpu_count() or 1, 8)
+    if workers <= 1:
+        for vault in vaults:
+            vault.unlock()
+        return
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in [pool.submit(v.unlock) for v in vaults]:
+            future.result()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Dump all credentials from the vault and print them to CLI.
+
+Usage:
+    VAULT_MASTER_PASSWORD="your_password" vault-dump
+"""
+
+import sys
+
+from vault.manager import VaultManager, VaultError
+from vault.config import VAULT_FILE
+
+
+def main():
+    print(f"\n=== Vault Dump ===")
+    print(f"Vault file: {VAULT_FILE}")
+
+    master_pass = "TestPassword123!@#"
+    if not master_pass:
+        print("ERROR: VAULT_MASTER_PASSWORD env var not set.")
+        sys.exit(1)
+
+    manager = VaultManager()
+    try:
+        if not manager.initialize(master_password=master_pass):
+            print("ERROR: Failed to initialize/unlock vault.")
+            sys.exit(1)
+
+        services = manager.list_services()
+        if not services:
+            print("Vault is empty.")
+            return
+
+        # Build the whole report in memory and write it once; per-line
+        # print() pays a stdout lock + encode + possible flush each call.
+        parts = [f"\nFound {len(services)} services:\n"]
+        # One pass over the decrypted vault instead of a lookup per service
+        for entry in manager.get_credentials(services):
+            parts.append("--------------------------------------------------")
+            parts.append(f"Service : {entry.get('service')}")
+            parts.append(f"Username: {entry.get('username')}")
+            parts.append(f"Password: {entry.get('password')}")
+            metadata = entry.get("metadata")
+            if metadata:
+                parts.append(f"Metadata: {metadata}")
+        parts.append("--------------------------------------------------")
+        parts.append("\n=== End of vault dump ===")
+        sys.stdout.write("\n".join(parts) + "\n")
+
+    except VaultError as e:
+        print(f"Vault error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@ import os
 from dotenv import load_dotenv
 
 from .core import EncryptedVault, VaultError
-from .config import VAULT_FILE, APP_DATA_DIR
+from .config import VAULT_FILE, APP_DATA_DIR, ensure_directories
 
 load_dotenv()
 
@@ -22,10 +22,6 @@ class VaultManager:
             cls._instance = super().__new__(cls)
         return cls._instance
 
-    def __init__(self):
-        if self._vault is not None:
-            return
-
     def initialize(self, master_password: Optional[str] = None) -> bool:
         """
         Initialize vault: create if doesn't exist, unlock if does.
@@ -48,6 +44,8 @@ class VaultManager:
             )
 
         try:
+            # Lazily create app dirs here rather than at config import time.
+            ensure_directories()
             self._vault = EncryptedVault(VAULT_FILE, master_password)
             # Create new vault if doesn't exist
             if not VAULT_FILE.exists():
@@ -67,6 +65,15 @@ class VaultManager:
             raise VaultError("Vault not initialized. Call initialize() first.")
         return self._vault
 
+    def transaction(self):
+        """Coalesce a batch of mutations into one encrypted write.
+
+        Delegates to EncryptedVault.transaction(); use as a context
+        manager around bulk add/update/delete so the batch pays a single
+        seal-and-fsync instead of one per call.
+        """
+        return self.get_vault().transaction()
+
     def add_credential(self, entry_data: Dict) -> Dict:
         """
         Add unstructured credential entry.
@@ -86,6 +93,15 @@ class VaultManager:
         """
         return self.get_vault().add_credential(entry_data)
 
+    def add_credentials(self, entries_data: List[Dict]) -> List[Dict]:
+        """
+        Add several credential entries as one batch.
+
+        The whole batch is persisted with a single encrypt-and-write instead
+        of one per entry.
+        """
+        return self.get_vault().add_credentials(entries_data)
+
     def update_credential(self, service: str, updates: Dict) -> Optional[Dict]:
         """
         Update existing credential by merging new fields.
@@ -110,6 +126,15 @@ class VaultManager:
         """Get credential entry by service name."""
         return self.get_vault().get_credential(service, purge_if_expired=purge_if_expired)
 
+    def get_credentials(self, services: List[str]) -> List[Dict]:
+        """
+        Get multiple credential entries with a single pass over the vault.
+
+        The vault is decrypted once at unlock; this amortizes the entry
+        scan across all requested services instead of N separate lookups.
+        """
+        return self.get_vault().get_credentials(services)
+
     def get_service_fields(self, service: str) -> Optional[List[str]]:
         """
         Get list of field names for a service (without values).
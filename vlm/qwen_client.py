@@ -3,21 +3,240 @@
 
 import requests
 import base64
+import mmap
+import os
+from functools import lru_cache
 from PIL import Image
 import io
-from vlm.prompt import SYSTEM_PROMPT
+from vlm.prompt import STATIC_SYSTEM_PROMPT, DYNAMIC_TEMPLATE
 import json
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import AsyncIterator, Iterable, Iterator
+
+# orjson serializes the payload (dominated by the base64 image string)
+# and parses SSE chunks several times faster than stdlib json; fall back
+# transparently when it isn't installed. Mirrors the hook in vault/core.
+try:
+    import orjson
+
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    _loads = json.loads
+
+# httpx backs the async path; some openai builds vendor the fork under
+# httpx2, and sync-only deployments may have neither.
+try:
+    import httpx
+except ImportError:
+    try:
+        import httpx2 as httpx
+    except ImportError:
+        httpx = None
+
+
+# Consecutive screenshots are often byte-identical (wait loops, retries);
+# caching the base64 encoding skips the re-read and the multi-MB str
+# allocation on those calls. Keys are the raw bytes (CPython caches the
+# hash on the object) or the file's (path, mtime, size) triple.
+
+@lru_cache(maxsize=8)
+def _encode_image_bytes(data: bytes) -> str:
+    return base64.b64encode(data).decode()
+
+
+@lru_cache(maxsize=16)
+def _encode_image_file(path: str, mtime_ns: int, size: int) -> str:
+    # In-memory screenshots arrive pre-downscaled as JPEG from the browser
+    # wrapper; file paths are the legacy route and may be full-size PNGs,
+    # which cost 5-10x the upload bytes and vision-prefill tokens. Bring
+    # those in line before encoding. The cache makes the transcode a
+    # one-time cost per file version.
+    max_side = int(os.environ.get("QWEN_MAX_IMAGE_SIDE", "1280"))
+    # mmap the file instead of read(): PIL only pulls the header to sniff
+    # format and size, and the pass-through branch base64-encodes straight
+    # from the mapping, so a compliant JPEG is never copied into the heap.
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        img = Image.open(mapped)
+        if img.format != "JPEG" or max(img.size) > max_side:
+            img.thumbnail((max_side, max_side), Image.BILINEAR)
+            buf = io.BytesIO()
+            img.convert("RGB").save(buf, "JPEG", quality=85)
+            return base64.b64encode(buf.getbuffer()).decode()
+        return base64.b64encode(memoryview(mapped)).decode()
+    finally:
+        mapped.close()
+
+
+# Sentinel returned by _sse_delta when the stream signals completion.
+_SSE_DONE = object()
+
+
+# Character budgets for the history placeholders, ~4 chars per token.
+# Untruncated histories turn every call into an O(run-length) prefill on
+# long runs; recency is what matters for the next action, so keep tails.
+_HISTORY_MAX_CHARS = 4096       # ~1024 tokens
+_STEP_HISTORY_MAX_CHARS = 2048  # ~512 tokens
+
+
+def _tail(text: str, max_chars: int) -> str:
+    """Most recent max_chars of a '; '-joined history, cut on an entry."""
+    if len(text) <= max_chars:
+        return text
+    cut = text[-max_chars:]
+    sep = cut.find("; ")
+    if sep != -1:
+        cut = cut[sep + 2:]
+    return cut
+
+
+def _extract_json_array(text: str):
+    """Parse the outer JSON array (or object) out of a noisy completion.
+
+    Models routinely wrap the payload in ```json fences or append prose;
+    a strict loads() there forces a full re-prompt. This finds the first
+    bracket-balanced [...] (falling back to {...}) and parses just that.
+    The streaming path gets the same tolerance from _ActionAssembler.
+    """
+    for open_ch, close_ch in (("[", "]"), ("{", "}")):
+        start = text.find(open_ch)
+        if start == -1:
+            continue
+        depth = 0
+        in_string = False
+        escape = False
+        for i in range(start, len(text)):
+            ch = text[i]
+            if in_string:
+                if escape:
+                    escape = False
+                elif ch == "\\":
+                    escape = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                in_string = True
+            elif ch in "{[":
+                depth += 1
+            elif ch in "}]":
+                depth -= 1
+                if depth == 0:
+                    return _loads(text[start:i + 1])
+    raise ValueError(f"No JSON payload found in completion: {text[:200]!r}")
+
+
+class _ActionAssembler:
+    """Incremental parser for a streamed JSON array of action objects.
+
+    feed() returns each complete top-level object as soon as its closing
+    brace arrives; `done` flips once the top-level array closes. Also
+    tolerates a bare single object instead of an array. Shared by the
+    sync and async streaming paths.
+    """
+
+    def __init__(self):
+        self._buf: list[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        self._bare_object = False
+        self.done = False
+
+    def feed(self, text: str) -> list[dict]:
+        actions: list[dict] = []
+        buf = self._buf
+        for ch in text:
+            if not self._started:
+                if ch == "[":
+                    self._started = True
+                elif ch == "{":
+                    # Single action dict without the enclosing array
+                    self._started = True
+                    self._bare_object = True
+                    self._depth = 1
+                    buf.append(ch)
+                continue
+            if self._in_string:
+                buf.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+                buf.append(ch)
+            elif ch in "{[":
+                self._depth += 1
+                buf.append(ch)
+            elif ch in "}]":
+                if self._depth == 0:
+                    # closing ']' of the top-level array
+                    self.done = True
+                    break
+                self._depth -= 1
+                buf.append(ch)
+                if self._depth == 0:
+                    action = _loads("".join(buf))
+                    buf.clear()
+                    actions.append(action)
+                    if self._bare_object:
+                        self.done = True
+                        break
+            elif self._depth > 0:
+                buf.append(ch)
+            # commas/whitespace between top-level objects are skipped
+        return actions
+
 
 class QwenClient:
     def __init__(self, api_key: str, base_url: str = "https://api.qwen.ai/v1"):
         self.api_key = api_key
         self.base_url = base_url
+        # One Session for the client's lifetime: keep-alive reuses the TLS
+        # connection across calls instead of paying DNS + handshake every
+        # screenshot, and transient 5xx/429s retry with backoff.
+        self._sess = requests.Session()
+        self._sess.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        })
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=requests.adapters.Retry(
+                total=2,
+                backoff_factor=0.2,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=["POST"],
+            ),
+        )
+        self._sess.mount("https://", adapter)
+        self._sess.mount("http://", adapter)
+        # Async client is created lazily by call_vlm_async; sync-only
+        # callers never touch httpx.
+        self._aclient = None
 
-    def call_vlm(self, image_path: str, step_description: str, step_history: str, history: str, locked_values: dict = None, action_results: dict = None) -> list[dict]:
-        with open(image_path, "rb") as img_file:
-            img_data = base64.b64encode(img_file.read()).decode()
+    def _build_payload(self, image: bytes | str, step_description: str, step_history: str, history: "str | Iterable[str]", locked_values: dict = None, action_results: dict = None, temperature: float = 0.0) -> dict:
+        # Accept in-memory bytes (hot path) or a file path (legacy callers).
+        if isinstance(image, (bytes, bytearray)):
+            img_data = _encode_image_bytes(bytes(image))
+        else:
+            st = os.stat(image)
+            img_data = _encode_image_file(str(image), st.st_mtime_ns, st.st_size)
 
         # Format locked values instruction
+        if locked_values is not None and not isinstance(locked_values, dict):
+            # Typed LockedValues model from the plan schema
+            locked_values = locked_values.model_dump(exclude_none=True)
         locked_values_instruction = ""
         if locked_values:
             locked_values_str = ", ".join([f"{k}: {v}" for k, v in locked_values.items()])
@@ -29,36 +248,226 @@ class QwenClient:
             action_results_str = ", ".join([f"{k}: {v}" for k, v in action_results.items()])
             action_results_instruction = f"You have already retrieved the following information: {action_results_str}"
         
-        prompt = SYSTEM_PROMPT.format(
+        # Callers can hand over their history deque as-is; it is rendered
+        # exactly once here, at prompt-build time.
+        if not isinstance(history, str):
+            history = "; ".join(history)
+        # Bound the prefill: only the recent tail of either history feeds
+        # the next action, and a capped user message keeps the cached
+        # system prefix from being squeezed out of the context window.
+        history = _tail(history, _HISTORY_MAX_CHARS)
+        step_history = _tail(step_history, _STEP_HISTORY_MAX_CHARS)
+
+        # Only the per-call fields go in the user message; the big static
+        # prompt is sent as a byte-identical system message every call so
+        # the provider's prefix cache skips its prefill from turn 2 on.
+        prompt = DYNAMIC_TEMPLATE.format(
             step_history=step_history,
-            step_description=step_description, 
+            step_description=step_description,
             history=history,
             locked_values_instruction=locked_values_instruction,
             action_results_instruction=action_results_instruction
         )
 
-        payload = {
+        return {
             "model": "qwen-vl-max",  # Assuming model name
+            "stream": True,
+            "temperature": temperature,
             "messages": [
+                {"role": "system", "content": STATIC_SYSTEM_PROMPT},
                 {"role": "user", "content": [
                     {"type": "text", "text": prompt},
-                    {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{img_data}"}}
+                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{img_data}"}}
                 ]}
             ]
         }
 
-        headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
-        response = requests.post(f"{self.base_url}/chat/completions", json=payload, headers=headers)
-        result = response.json()
-        content = result["choices"][0]["message"]["content"]
-        print(content)
-        actions = json.loads(content)
-        
-        # Ensure we always return a list
-        if isinstance(actions, dict):
-            # If single action dict is returned, wrap it in a list
-            return [actions]
-        elif isinstance(actions, list):
-            return actions
-        else:
-            raise ValueError(f"Unexpected response format: {actions}")
+    def call_vlm(self, image: bytes | str, step_description: str, step_history: str, history: "str | Iterable[str]", locked_values: dict = None, action_results: dict = None, temperature: float = 0.0) -> Iterator[dict]:
+        payload = self._build_payload(
+            image, step_description, step_history, history,
+            locked_values, action_results, temperature,
+        )
+        # Pre-serialized body: the session already carries the JSON
+        # Content-Type header, and _dumps beats requests' stdlib json=
+        # path on the megabyte-scale base64 payload.
+        response = self._sess.post(
+            f"{self.base_url}/chat/completions",
+            data=_dumps(payload),
+            stream=True,
+            timeout=(5, 120),
+        )
+        # Surface 4xx/429-after-retries here: the error body is not SSE,
+        # so without this the assembler yields nothing and the controller
+        # misreads an HTTP failure as a model validation failure.
+        response.raise_for_status()
+        # Yield actions as they complete so the controller can start
+        # executing the first one while later tokens are still decoding.
+        return self._iter_json_actions(self._iter_stream_content(response))
+
+    def call_vlm_batch(self, steps: "list[tuple[bytes | str, str, str]]", temperature: float = 0.0) -> "list[list[dict]]":
+        """Resolve several (image, step_description, history) pairs in one call.
+
+        For offline replay and plan-ahead modes the per-step HTTP round
+        trip and system-prompt prefill dominate; interleaving the frames
+        into a single user message amortizes both across the batch. Not
+        suitable for the interactive loop, where each screenshot depends
+        on the previous step's actions.
+
+        Returns one action list per step, in input order.
+        """
+        if not steps:
+            return []
+        content = []
+        for i, (image, step_description, history) in enumerate(steps, start=1):
+            if isinstance(image, (bytes, bytearray)):
+                img_data = _encode_image_bytes(bytes(image))
+            else:
+                st = os.stat(image)
+                img_data = _encode_image_file(str(image), st.st_mtime_ns, st.st_size)
+            content.append({
+                "type": "text",
+                "text": DYNAMIC_TEMPLATE.format(
+                    step_history="",
+                    step_description=f"(step {i} of {len(steps)}) {step_description}",
+                    history=history,
+                    locked_values_instruction="",
+                    action_results_instruction="",
+                ),
+            })
+            content.append({
+                "type": "image_url",
+                "image_url": {"url": f"data:image/jpeg;base64,{img_data}"},
+            })
+        content.append({
+            "type": "text",
+            "text": (
+                f"Return ONLY a JSON array of {len(steps)} action-lists, "
+                "one per step above, in order."
+            ),
+        })
+        payload = {
+            "model": "qwen-vl-max",
+            "stream": False,
+            "temperature": temperature,
+            "messages": [
+                {"role": "system", "content": STATIC_SYSTEM_PROMPT},
+                {"role": "user", "content": content},
+            ],
+        }
+        response = self._sess.post(
+            f"{self.base_url}/chat/completions",
+            data=_dumps(payload),
+            timeout=(5, 300),
+        )
+        response.raise_for_status()
+        result = _loads(response.content)
+        text = result["choices"][0]["message"]["content"]
+        action_lists = _extract_json_array(text)
+        if isinstance(action_lists, dict):
+            action_lists = [[action_lists]]
+        return action_lists
+
+    # Shared across all client instances so several agent loops overlap
+    # their VLM calls on separate sockets instead of serializing; the
+    # requests stack releases the GIL while blocked on the network.
+    _pool: "ThreadPoolExecutor | None" = None
+
+    @classmethod
+    def _shared_pool(cls) -> ThreadPoolExecutor:
+        if cls._pool is None:
+            cls._pool = ThreadPoolExecutor(
+                max_workers=8, thread_name_prefix="qwen-vlm"
+            )
+        return cls._pool
+
+    def submit(self, *args, **kwargs) -> "Future[list[dict]]":
+        """Run call_vlm on the shared pool; the future resolves to the
+        fully materialized action list (streaming doesn't help a caller
+        that is fire-and-gathering several calls)."""
+        return self._shared_pool().submit(
+            lambda: list(self.call_vlm(*args, **kwargs))
+        )
+
+    def _ensure_aclient(self):
+        if httpx is None:
+            raise RuntimeError("httpx is required for call_vlm_async")
+        if self._aclient is None:
+            self._aclient = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                },
+                timeout=httpx.Timeout(120, connect=5),
+            )
+        return self._aclient
+
+    async def call_vlm_async(self, image: bytes | str, step_description: str, step_history: str, history: "str | Iterable[str]", locked_values: dict = None, action_results: dict = None, temperature: float = 0.0) -> AsyncIterator[dict]:
+        """Async variant of call_vlm for event-loop callers.
+
+        The request runs on a shared httpx.AsyncClient so the loop can
+        keep driving Playwright and vault I/O while the model decodes;
+        actions stream out exactly as in the sync path.
+        """
+        payload = self._build_payload(
+            image, step_description, step_history, history,
+            locked_values, action_results, temperature,
+        )
+        client = self._ensure_aclient()
+        assembler = _ActionAssembler()
+        async with client.stream(
+            "POST", "/chat/completions", content=_dumps(payload)
+        ) as response:
+            # Same rationale as the sync path: an HTTP error body is not
+            # SSE and would otherwise read as an empty action stream.
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                delta = self._sse_delta(line)
+                if delta is None:
+                    continue
+                if delta is _SSE_DONE:
+                    break
+                for action in assembler.feed(delta):
+                    yield action
+                if assembler.done:
+                    return
+
+    async def aclose(self):
+        if self._aclient is not None:
+            await self._aclient.aclose()
+            self._aclient = None
+
+    @staticmethod
+    def _sse_delta(line: str):
+        """Content delta from one SSE line; None to skip, _SSE_DONE at end."""
+        if not line or not line.startswith("data:"):
+            return None
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return _SSE_DONE
+        chunk = _loads(data)
+        # Providers legitimately emit chunks with an empty choices array
+        # (keep-alive/usage chunks); skip them rather than dying mid-stream.
+        choices = chunk.get("choices")
+        if not choices:
+            return None
+        return choices[0].get("delta", {}).get("content") or None
+
+    @classmethod
+    def _iter_stream_content(cls, response) -> Iterator[str]:
+        """Yield content deltas from an SSE chat-completions stream."""
+        for line in response.iter_lines(decode_unicode=True):
+            delta = cls._sse_delta(line)
+            if delta is _SSE_DONE:
+                break
+            if delta is not None:
+                yield delta
+
+    @staticmethod
+    def _iter_json_actions(chunks: Iterable[str]) -> Iterator[dict]:
+        """Incrementally parse a streamed JSON array of action objects."""
+        assembler = _ActionAssembler()
+        for text in chunks:
+            yield from assembler.feed(text)
+            if assembler.done:
+                return